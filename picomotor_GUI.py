@@ -47,17 +47,92 @@ TODO:
 
 import usb.core
 import usb.util
-import re
-
-NEWFOCUS_COMMAND_REGEX = re.compile("([0-9]{0,1})([a-zA-Z?]{2,})([0-9+-]*)")
+import array
+import string
+import functools
+import threading
+import errno
+import time
+import os
+import sys
+import selectors
+import struct
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# Characters of a NewFocus command: optional driver digit, mnemonic, parameter (see _parse_command)
+DIGIT_CHARS = frozenset(string.digits)
+MNEMONIC_CHARS = frozenset(string.ascii_letters + '?')
+PARAMETER_CHARS = frozenset(string.digits + '+-')
 MOTOR_TYPE = {
         "0":"No motor connected",
         "1":"Motor Unknown",
         "2":"'Tiny' Motor",
         "3":"'Standard' Motor"
         }
-
-class Controller(object):
+JOYSTICK_BITS = 15 # stick axes report raw positions in [-32768, 32767], i.e. a 2**15 bound
+MAX_SPEED = 2000 # maximal speed (steps/s) for New Focus motor 8821-L, sent at full stick deflection
+DEADZONE_RAW = 328 # raw stick positions with |state| below this (1% of the 32768 range) count as centred
+MD_POLL_INTERVAL = 0.002 # pause (s) between two motion-done queries of the background poller
+CHAIN_READ_TIMEOUT = 100 # wait (ms) for each packet of replies to a chained query
+EVDEV_FORMAT = 'llHHi' # Linux struct input_event: timeval, type, code, value
+EVDEV_EVENT_SIZE = struct.calcsize(EVDEV_FORMAT)
+EVDEV_ABS = 3 # evdev type of absolute axis events
+EVDEV_AXES = {0: 'ABS_X', 1: 'ABS_Y', 2: 'ABS_Z', 3: 'ABS_RX', 4: 'ABS_RY', 5: 'ABS_RZ'} # evdev codes of the stick and trigger axes
+JOYSTICK_UI_INTERVAL = 0.033 # time (s) between two joystick position updates on the GUI
+
+def _parse_command(newfocus_command):
+    """Convert a NewFocus style command into a USB command, None if its format is invalid
+
+    See Controller.parse_command
+    """
+    c = newfocus_command
+
+    # Split the command by hand: optional driver digit, mnemonic, parameter
+    i = 1 if c[:1] in DIGIT_CHARS else 0
+    j = i
+    while j < len(c) and c[j] in MNEMONIC_CHARS:
+        j += 1
+    k = j
+    while k < len(c) and c[k] in PARAMETER_CHARS:
+        k += 1
+
+    # a valid command has a mnemonic of at least two characters; anything after
+    # the parameter is ignored
+    if j - i < 2:
+        return None
+    driver_number, command, parameter = c[:i], c[i:j], c[j:k]
+
+    usb_command = command
+
+    # Construct USB safe command
+    if driver_number:
+        usb_command = '1>{driver_number} {command}'.format(
+                                            driver_number=driver_number,
+                                            command=usb_command
+                                            )
+    if parameter:
+        usb_command = '{command} {parameter}'.format(
+                                            command=usb_command,
+                                            parameter=parameter
+                                            )
+
+    usb_command += '\r'
+
+    return usb_command
+
+@functools.lru_cache(maxsize=1024)
+def _compile_cmd(newfocus_command):
+    """USB command bytes for a NewFocus command, cached so every distinct command is parsed once"""
+    usb_command = _parse_command(newfocus_command)
+    if usb_command is not None:
+        return usb_command.encode()
+
+@functools.lru_cache(maxsize=512)
+def _va_cmd(motor, speed):
+    """USB command setting the velocity of a motor, cached per (motor, speed)"""
+    return _parse_command('{}VA{}'.format(motor, speed)).encode()
+
+class Controller(QObject):
     """Picomotor Controller
 
     Example:
@@ -68,8 +143,8 @@ class Controller(object):
         >>> controller.start_console()
     """
 
-
     def __init__(self, idProduct, idVendor,lx,ly,rx,ry,fx,fy):
+        super(Controller, self).__init__()
 
         # convert hex value in string to hex value
         idProduct = int(idProduct, 16)
@@ -79,17 +154,31 @@ class Controller(object):
         self.idProduct = idProduct
         self.idVendor = idVendor
         self.connect_success = 0
+        self.usb_lock = threading.Lock() # one query at a time, so every reply is read by the thread that asked
+        self._write_lock = threading.Lock() # serializes writes to the OUT endpoint
+        self.md_state = [1, 1, 1, 1] # latest motion-done status of motors 1-4, updated by _MDPoller
+        self._md_lock = threading.Lock() # guards md_state and _md_gen
+        self._md_gen = [0, 0, 0, 0] # bumped after every MV/ST written to a motor; a poll reply is only kept if it did not change
         if self._connect(): # In the case of unsuccessful connection
             return None
         self.command('ST')
-        self.marker = {'1':0, '2':0, '3':0, '4':0} # These makers are used to avoid multiple commmands on the same motor to cause disfunction
+        # USB commands used by the joystick loop, built once for every motor
+        self._cmds = {m: {'ST': _compile_cmd(m+'ST'),
+                          'MV+': _compile_cmd(m+'MV+'),
+                          'MV-': _compile_cmd(m+'MV-')}
+                      for m in '1234'}
+        self._dir = [None, None, None, None] # direction ('+'/'-') of the last move sent to each motor, None once stopped; avoids multiple commands on the same motor
+        self._last_va = {'1':None, '2':None, '3':None, '4':None} # last velocity sent to each motor, None after a stop
         self.lx = lx
         self.ly = ly
         self.rx = rx
         self.ry = ry
         self.fx = fx
         self.fy = fy
-        self.position = 0
+        # event code -> (attribute holding the driven motor, attribute of its fine tuning switch)
+        self._axis_table = {'ABS_X': ('lx', None), 'ABS_Y': ('ly', None),
+                            'ABS_RX': ('rx', 'fx'), 'ABS_RY': ('ry', 'fy')}
+        self.position = 0 # latest raw stick position, read by the GUI every JOYSTICK_UI_INTERVAL
         
 
     def _connect(self):
@@ -112,12 +201,14 @@ class Controller(object):
         if self.dev is None:
             return 1
 
-        # set the active configuration. With no arguments, the first
-        # configuration will be the active one
-        self.dev.set_configuration()
-
-        # get an endpoint instance
-        cfg = self.dev.get_active_configuration()
+        # get an endpoint instance; the device is only configured if it has no
+        # active configuration yet. With no arguments, the first configuration
+        # will be the active one
+        try:
+            cfg = self.dev.get_active_configuration()
+        except usb.core.USBError:
+            self.dev.set_configuration()
+            cfg = self.dev.get_active_configuration()
         intf = cfg[(0,0)]
 
         self.ep_out = usb.util.find_descriptor(
@@ -137,13 +228,19 @@ class Controller(object):
                 usb.util.ENDPOINT_IN)
 
         assert (self.ep_out and self.ep_in) is not None
+
+        # Replies are read into this buffer in place; all reads happen under usb_lock
+        self._rx_buf = array.array('B', bytes(128))
         
         # Confirm connection to user
         self.command('MC')
         resp = self.command('VE?')
         self.status = ''
-        for m in range(1,5):
-            resp = self.command("{}QM?".format(m))
+        queries = ["{}QM?".format(m) for m in range(1,5)]
+        replies = self.query_chain(queries)
+        if len(replies) != len(queries): # fall back to probing the motors one by one
+            replies = [self.command(q) for q in queries]
+        for m, resp in enumerate(replies, 1):
             self.status += "Motor {motor_number}: {status}\n".format(
                                                     motor_number=m,
                                                     status=MOTOR_TYPE[resp[-1]]
@@ -151,11 +248,15 @@ class Controller(object):
         self.status = self.status[:-1]
         self.connect_success = 1
 
+        # Poll motion-done status in the background so the joystick loop never waits on it
+        self.md_poller = _MDPoller(self)
+        self.md_poller.start()
+
     def send_command(self, usb_command, get_reply=False):
         """Send command to USB device endpoint
         
         Args:
-            usb_command (str): Correctly formated command for USB driver
+            usb_command (str or bytes): Correctly formated command for USB driver
             get_reply (bool): query the IN endpoint after sending command, to 
                 get controller's reply
 
@@ -163,9 +264,15 @@ class Controller(object):
             Character representation of returned hex values if a reply is 
                 requested
         """
-        self.ep_out.write(usb_command)
         if get_reply:
-            return self.ep_in.read(100)
+            with self.usb_lock:
+                with self._write_lock:
+                    self.ep_out.write(usb_command)
+                n = self.ep_in.read(self._rx_buf)
+                return self._rx_buf[:n]
+        # commands without reply go out even while a query waits for its answer
+        with self._write_lock:
+            self.ep_out.write(usb_command)
             
 
     def parse_command(self, newfocus_command):
@@ -178,37 +285,17 @@ class Controller(object):
                 it could also have optional or required preceding (xx) and/or 
                 following (nn) parameters.
                 cite [2 - 6.1.2]
-        """
-        m = NEWFOCUS_COMMAND_REGEX.match(newfocus_command)
-
-        # Check to see if a regex match was found in the user submitted command
-        if m:
-
-            # Extract matched components of the command
-            driver_number, command, parameter = m.groups()
 
-
-            usb_command = command
-
-            # Construct USB safe command
-            if driver_number:
-                usb_command = '1>{driver_number} {command}'.format(
-                                                    driver_number=driver_number,
-                                                    command=usb_command
-                                                    )
-            if parameter:
-                usb_command = '{command} {parameter}'.format(
-                                                    command=usb_command,
-                                                    parameter=parameter
-                                                    )
-
-            usb_command += '\r'
-
-            return usb_command
-        else:
+        Returns:
+            usb_command (bytes): Command ready to be written to the OUT endpoint,
+                None if the command does not have a valid format
+        """
+        usb_command = _compile_cmd(newfocus_command)
+        if usb_command is None:
             print("ERROR! Command {} was not a valid format".format(
                                                             newfocus_command
                                                             ))
+        return usb_command
 
 
     def parse_reply(self, reply):
@@ -222,8 +309,7 @@ class Controller(object):
         """
 
         # convert hex to characters 
-        reply = ''.join([chr(x) for x in reply])
-        return reply.rstrip()
+        return bytes(reply).decode('ascii', errors='ignore').rstrip()
 
 
     def command(self, newfocus_command):
@@ -236,6 +322,8 @@ class Controller(object):
             reply (str): Human readable reply from controller
         """
         usb_command = self.parse_command(newfocus_command)
+        if usb_command is None: # parse_command already reported the error
+            return
 
         # if there is a '?' in the command, the user expects a response from
         # the driver
@@ -250,94 +338,142 @@ class Controller(object):
         if get_reply:
             return self.parse_reply(reply)
 
+    def query_chain(self, newfocus_commands):
+        """Send several NewFocus queries in one ';'-separated USB write
+
+        Args:
+            newfocus_commands (list): Legal query commands, each expecting a reply
+
+        Returns:
+            replies (list): Human readable replies in the order of the queries;
+                shorter than newfocus_commands if the controller stopped answering
+        """
+        usb_command = b';'.join(_compile_cmd(c)[:-1] for c in newfocus_commands) + b'\r'
+        replies = []
+        with self.usb_lock:
+            with self._write_lock:
+                self.ep_out.write(usb_command)
+            # the replies may arrive in more than one packet
+            while len(replies) < len(newfocus_commands):
+                try:
+                    n = self.ep_in.read(self._rx_buf, CHAIN_READ_TIMEOUT)
+                except usb.core.USBError:
+                    break
+                replies += [r for r in self.parse_reply(self._rx_buf[:n]).split('\r\n') if r]
+        return replies
+
+    def _stop(self, motor, index):
+        """Stop a motor (index = motor number - 1) and forget its speed and direction"""
+        self.send_command(self._cmds[motor]['ST'])
+        if self._dir[index] is not None:
+            self._motion_sent(index, False)
+        self._dir[index] = None
+        self._last_va[motor] = None
+
+    def _motion_sent(self, index, moving):
+        """Discard the 'MD?' replies of a motor (index = motor number - 1) that were in
+        flight across the MV/ST just written; after a move the motor counts as not done
+        until a later poll says otherwise"""
+        with self._md_lock:
+            self._md_gen[index] += 1
+            if moving:
+                self.md_state[index] = 0
+
+    def _speed_cmd(self, motor, speed):
+        """Velocity command for a motor, or None if it already runs at that speed"""
+        if speed == self._last_va[motor]:
+            return None
+        self._last_va[motor] = speed
+        return _va_cmd(motor, speed)
+
+    def _move_cmd(self, motor, index, direction):
+        """Command starting an indefinite move of a motor (index = motor number - 1); records its direction"""
+        self._dir[index] = direction
+        return self._cmds[motor]['MV'+direction]
+
+    def _handle_axis(self, motor, raw, fine):
+        """Drive a motor from the raw position of a stick axis
+
+        Args:
+            motor (str): Number of the motor driven by the axis
+            raw (int): Raw axis position, bounded by 2**JOYSTICK_BITS
+            fine (bool): Fine tuning, run at a tenth of the full speed
+        """
+        index = ord(motor) - 49 # '1'..'4' -> 0..3
+        abs_raw = -raw if raw < 0 else raw
+        if abs_raw < DEADZONE_RAW:
+            self._stop(motor, index)
+            return
+        direction = '+' if raw > 0 else '-'
+        moving = self._dir[index]
+        if moving is not None and moving != direction:
+            # The stick crossed the centre without a dead-zone sample; stop first,
+            # the move in the new direction follows once the motor is done
+            self._stop(motor, index)
+            return
+        speed = (MAX_SPEED * abs_raw) >> JOYSTICK_BITS
+        if fine:
+            speed //= 10
+        va = self._speed_cmd(motor, speed)
+        if moving is None and self.md_state[index] == 1:
+            mv = self._move_cmd(motor, index, direction)
+            # The controller accepts ';'-separated commands, so a new speed and
+            # the move go out in a single write
+            self.send_command(va[:-1] + b';' + mv if va else mv)
+            self._motion_sent(index, True)
+        elif va:
+            self.send_command(va)
+
+    def _evdev_batches(self, path):
+        """Yield lists of (code, state) axis events read straight from a Linux evdev device
+
+        Sleeps in select() until the device has data, then takes every queued
+        event with a single read, so an idle stick costs no CPU time
+        """
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        selector = selectors.DefaultSelector()
+        selector.register(fd, selectors.EVENT_READ)
+        while True:
+            selector.select()
+            try:
+                data = os.read(fd, EVDEV_EVENT_SIZE * 64)
+            except BlockingIOError:
+                continue
+            yield [(EVDEV_AXES.get(code), state)
+                   for _, _, ev_type, code, state in struct.iter_unpack(EVDEV_FORMAT, data)
+                   if ev_type == EVDEV_ABS]
+
     def loop(self):
-        while True: #loop to detect the changes of joystick/gamepad
-            events = get_gamepad()
-            for event in events:
-                #print(event.state)
-                #print(self.marker)
-                if event.ev_type == 'Absolute':
-                    ex.joystick.setText('Joystick position\n'+str(event.state))
-                    axis = event.state / joystick_range # 32768 is the bound of the axis of the joystick we used, it is used to normalize the value of axis
-                    if event.code == 'ABS_X':
-                        #print(axis)
-                        if -0.01 < axis and 0.01 > axis:
-                            self.command(self.lx+'ST')
-                            self.marker[self.lx] = 0 
-                        else:
-                            self.command(self.lx+'VA'+str(int(2000 * abs(axis)))) # 2000 is the maximal speed for New Focus motor 8821-L
-                            #if float(self.command('1MV?')[-1]) * axis < 0: # Used to prevent fast change of motion direction, but seems uncessary
-                            #    self.command('1ST')
-                            #print(self.command('MD?'))
-                            if int(self.command(self.lx+'MD?')[-1]) == 1 and not self.marker[self.lx]:
-                                if axis > 0:
-                                    dir = '+'
-                                else:
-                                    dir = '-'
-                                self.marker[self.lx] = 1
-                                self.command(self.lx+'MV'+dir)
-                    elif event.code == 'ABS_Y': # Same as the 'ABS_X' part but for an additional axis
-                        #print(axis)
-                        if -0.01 < axis and 0.01 > axis:
-                            self.command(self.ly+'ST')
-                            self.marker[self.ly] = 0 
-                        else:
-                            self.command(self.ly+'VA'+str(int(2000 * abs(axis))))
-                            #if float(self.command('2MV?')[-1]) * axis < 0:
-                            #    self.command('2ST')
-                            if int(self.command(self.ly+'MD?')[-1]) == 1 and not self.marker[self.ly]:
-                                if axis > 0:
-                                    dir = '+'
-                                else:
-                                    dir = '-'
-                                self.marker[self.ly] = 1
-                                self.command(self.ly+'MV'+dir)
-                    elif event.code == 'ABS_RX': # Same as the 'ABS_X' part but for an additional axis
-                        #print(axis)
-                        if -0.01 < axis and 0.01 > axis:
-                            self.command(self.rx+'ST')
-                            self.marker[self.rx] = 0 
-                        else:
-                            if self.fx:
-                                f1 = 0.1
-                            else:
-                                f1 = 1
-                            self.command(self.rx+'VA'+str(int(2000 * abs(axis) * f1)))
-                            #if float(self.command('1MV?')[-1]) * axis < 0:
-                            #    self.command('1ST')
-                            if int(self.command(self.rx+'MD?')[-1]) == 1 and not self.marker[self.rx]:
-                                if axis > 0:
-                                    dir = '+'
-                                else:
-                                    dir = '-'
-                                self.marker[self.rx] = 1
-                                self.command(self.rx+'MV'+dir)
-                    elif event.code == 'ABS_RY': # Same as the 'ABS_X' part but for an additional axis
-                        #print(axis)
-                        if -0.01 < axis and 0.01 > axis:
-                            self.command(self.ry+'ST')
-                            self.marker[self.ry] = 0 
-                        else:
-                            if self.fy:
-                                f2 = 0.1
-                            else:
-                                f2 = 1                            
-                            self.command(self.ry+'VA'+str(int(2000 * abs(axis) * f2)))
-                            #if float(self.command('2MV?')[-1]) * axis < 0:
-                            #    self.command('2ST')
-                            if int(self.command(self.ry+'MD?')[-1]) == 1 and not self.marker[self.ry]:
-                                if axis > 0:
-                                    dir = '+'
-                                else:
-                                    dir = '-'
-                                self.marker[self.ry] = 1
-                                self.command(self.ry+'MV'+dir)
+        try:
+            gamepad = devices.gamepads[0]
+        except IndexError:
+            raise UnpluggedError("No gamepad found.")
+        if sys.platform.startswith('linux'):
+            batches = self._evdev_batches(gamepad.get_char_device_path())
+        else:
+            # Iterate one gamepad for the whole session; get_gamepad() looks the
+            # device up and builds a new event generator for every batch
+            batches = ([(event.code, event.state) for event in events if event.ev_type == 'Absolute']
+                       for events in gamepad)
+        # Bind what the event loop touches to locals once; the motor/fine tuning
+        # attributes are still read from self so the GUI can change them at any time
+        handle_axis = self._handle_axis
+        axis_table = self._axis_table
+        for batch in batches: #loop to detect the changes of joystick/gamepad
+            for code, state in batch:
+                #print(state)
+                #print(self._dir)
+                self.position = state # shown by the GUI at display rate
+                entry = axis_table.get(code)
+                if entry is None: # not one of the two sticks
+                    continue
+                motor_attr, fine_attr = entry
+                handle_axis(getattr(self, motor_attr), state, bool(fine_attr and getattr(self, fine_attr)))
 
 
 #GUI
-import sys
 from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QGridLayout, QComboBox, QLineEdit, QLabel, QCheckBox
-from PyQt5.QtCore import  QThread
+from PyQt5.QtCore import  QThread, QTimer
 
 class Worker(QThread):
     def __init__(self, work):
@@ -347,6 +483,57 @@ class Worker(QThread):
     def run(self):
         self.work()
 
+class _MDPoller(QThread):
+    """Keep Controller.md_state in sync with the 'MD?' replies of motors 1-4"""
+    def __init__(self, controller):
+        super(_MDPoller, self).__init__()
+        self.controller = controller
+
+    def run(self):
+        controller = self.controller
+        queries = [_compile_cmd(m+'MD?') for m in '1234']
+        failing = False # whether the last query failed; errors are reported once per run of failures
+        while True:
+            for i, query in enumerate(queries):
+                gen = controller._md_gen[i]
+                try:
+                    reply = controller.send_command(query, True)
+                    done = int(controller.parse_reply(reply)[-1])
+                except (usb.core.USBError, IndexError, ValueError) as e:
+                    if getattr(e, 'errno', None) == errno.ENODEV:
+                        print("ERROR! Motor controller disconnected, motion-done polling stopped")
+                        return
+                    # a timeout or garbled reply must not end the polling; back off and retry
+                    if not failing:
+                        print("ERROR! Motion-done query of motor {} failed: {}".format(i + 1, e))
+                        failing = True
+                    time.sleep(CHAIN_READ_TIMEOUT / 1000)
+                    continue
+                failing = False
+                with controller._md_lock:
+                    if controller._md_gen[i] == gen: # no MV/ST went out while the query was in flight
+                        controller.md_state[i] = done
+                time.sleep(MD_POLL_INTERVAL)
+
+class ConnectWorker(QThread):
+    """Set up a Controller away from the GUI thread and hand it back through 'done', None if it failed"""
+    done = pyqtSignal(object)
+
+    def __init__(self, *args):
+        super(ConnectWorker, self).__init__()
+        self.args = args
+
+    def run(self):
+        try:
+            controller = Controller(*self.args)
+        except Exception as e:
+            print("ERROR! Connection failed: {}".format(e))
+            self.done.emit(None)
+            return
+        # the controller outlives this thread; let the GUI thread own it
+        controller.moveToThread(QApplication.instance().thread())
+        self.done.emit(controller)
+
 class ui(QWidget):
 
     def __init__(self):
@@ -459,6 +646,9 @@ class ui(QWidget):
     def rightyActivated(self):  #Functions of selection bar on potential type
         self.controller.ry = str(self.rightyMode.currentIndex()+1)
     
+    def showJoystick(self, state):
+        self.joystick.setText('Joystick position\n'+str(state))
+
     def fxsig(self):
         self.controller.fx = self.finex.isChecked()
     
@@ -466,13 +656,22 @@ class ui(QWidget):
         self.controller.fy = self.finey.isChecked()
     
     def motorConnect(self):
-        self.controller = Controller(self.PIDEdit.text(), self.VIDEdit.text(),str(self.leftxMode.currentIndex()+1),
+        self.connector.setEnabled(False) # no second connection while this one is set up
+        self.connectWorker = ConnectWorker(self.PIDEdit.text(), self.VIDEdit.text(),str(self.leftxMode.currentIndex()+1),
             str(self.leftyMode.currentIndex()+1),str(self.rightxMode.currentIndex()+1),str(self.rightyMode.currentIndex()+1),self.finex.isChecked(),self.finey.isChecked())
-        if self.controller.connect_success:
+        self.connectWorker.done.connect(self.motorConnected)
+        self.connectWorker.start()
+
+    def motorConnected(self, controller):
+        self.controller = controller
+        if self.controller is not None and self.controller.connect_success:
             self.mstatus.setText(self.controller.status)
+            # the GUI only needs display-rate updates of the stick position
+            self.joystickTimer = QTimer(self)
+            self.joystickTimer.timeout.connect(lambda: self.showJoystick(self.controller.position))
+            self.joystickTimer.start(int(JOYSTICK_UI_INTERVAL * 1000))
             self.looper = Worker(self.controller.loop)
             self.looper.start()
-            self.connector.setEnabled(False)
             self.notice.setText('')
             self.leftxMode.setEnabled(True)
             self.leftyMode.setEnabled(True)
@@ -482,6 +681,7 @@ class ui(QWidget):
             self.finey.setEnabled(True)
             self.joystick.setText('Joystick Position\n')
         else:
+            self.connector.setEnabled(True)
             self.notice.setText('To get PID and VID:\nFor Mac, run the following command in a new terminal window: "$ system_profiler SPUSB'
                 +'DataType"\nFor Windows, check Device Manager -> <device name> -> property -> details -> hardware id\nNo Device Detected!')
     
@@ -490,9 +690,7 @@ class ui(QWidget):
 
 
 if __name__ == '__main__':
-    from inputs import get_gamepad
-    import os
-    joystick_range = 32768
+    from inputs import devices, UnpluggedError
     app = QApplication(sys.argv)
     ex = ui()
     ex.show()
@@ -47,15 +47,128 @@ TODO:
 
 import usb.core
 import usb.util
-import re
-
-NEWFOCUS_COMMAND_REGEX = re.compile("([0-9]{0,1})([a-zA-Z?]{2,})([0-9+-]*)")
+import string
+import functools
+import array
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+DIGIT_CHARS = frozenset(string.digits)
+MNEMONIC_CHARS = frozenset(string.ascii_letters + '?')
+PARAMETER_CHARS = frozenset(string.digits + '+-')
 MOTOR_TYPE = {
         "0":"No motor connected",
         "1":"Motor Unknown",
         "2":"'Tiny' Motor",
         "3":"'Standard' Motor"
         }
+RX_BUFFER_SIZE = 4096 # bytes requested per read; the controller ends the transfer early with a short packet
+STARTUP_READ_TIMEOUT = 100 # wait (ms) for each packet of replies to the batched startup queries
+VA_DEADBAND = 0.01 # velocity changes smaller than this fraction of the axis's maximal speed are not sent to the controller
+MD_WATCHDOG_INTERVAL = 1.0 # time (s) after which the local motion state of a motor is checked with 'MD?'
+EVENT_QUEUE_SIZE = 8 # gamepad events waiting for the USB loop before the gamepad thread blocks
+COALESCE_WINDOW = 0.005 # time (s) during which events of the same axis are merged into the latest one
+EVENT_WAIT_TIMEOUT = 0.1 # time (s) the main loop waits for an event at once, so Ctrl+C is handled on Windows
+INV_32768 = 1.0 / 32768.0 # 32768 is the bound of the axis of the joystick we used, it is used to normalize the value of axis
+DEADBAND = 0.05 # normalized axis values below this stop the motor
+SPEED_MAIN = 2000 # 2000 is the maximal speed for New Focus motor 8821-L
+SPEED_FINE = 200 # a tenth of SPEED_MAIN, for fine tuning with the right stick
+DEBUG = False # print the controller's 'MD?' reply on every move of the left stick's X axis
+
+def _parse(newfocus_command):
+    """Split a NewFocus style command into (driver_number, command, parameter)
+
+    Accepts an optional driver digit, a mnemonic of at least two letters or '?' and a
+    parameter of digits, '+' and '-'; returns None if anything else is left over
+    """
+    c = newfocus_command
+    i = 1 if c[:1] in DIGIT_CHARS else 0
+    j = i
+    while j < len(c) and c[j] in MNEMONIC_CHARS:
+        j += 1
+    k = j
+    while k < len(c) and c[k] in PARAMETER_CHARS:
+        k += 1
+    if j - i < 2 or k != len(c):
+        return None
+    return c[:i], c[i:j], c[j:]
+
+@functools.lru_cache(maxsize=256)
+def _parse_command_cached(newfocus_command):
+    """Convert a NewFocus style command into a USB command, memoized per command string
+
+    See Controller.parse_command; returns None if the command does not have a valid format
+    """
+    m = _parse(newfocus_command)
+
+    # Check to see if the user submitted command has a valid format
+    if m:
+
+        # Extract the components of the command
+        driver_number, command, parameter = m
+
+
+        usb_command = bytearray()
+
+        # Construct USB safe command, as bytes so pyusb does not encode it on every write
+        if driver_number:
+            usb_command += b'1>' + driver_number.encode() + b' '
+        usb_command += command.encode()
+        if parameter:
+            usb_command += b' ' + parameter.encode()
+
+        usb_command += b'\r'
+
+        return bytes(usb_command)
+
+# USB commands used by the joystick loop, preformatted per motor in the layout
+# parse_command produces, so the loop never goes through the parser
+_ST = {m: b'1>%d ST\r' % m for m in range(1, 5)}
+_MD = {m: b'1>%d MD?\r' % m for m in range(1, 5)}
+_VA_TMPL = {m: b'1>%d VA %%d\r' % m for m in range(1, 5)}
+_MV = {(m, d): b'1>%d MV %s\r' % (m, d.encode()) for m in range(1, 5) for d in '+-'}
+
+# Joystick axes driving the motors: code -> (motor, maximal speed, own marker, marker of
+# the axis sharing the motor)
+AXES = {
+        'ABS_X': (1, SPEED_MAIN, 'x', 'rx'),
+        'ABS_Y': (2, SPEED_MAIN, 'y', 'ry'),
+        'ABS_RX': (1, SPEED_FINE, 'rx', 'x'),
+        'ABS_RY': (2, SPEED_FINE, 'ry', 'y')
+        }
+
+# Actions returned by _decide
+ACT_IGNORE = 0 # the other axis on the motor is in use
+ACT_STOP = 1 # stick in the deadzone, stop the motor
+ACT_HOLD = 2 # keep moving at the current velocity
+ACT_SPEED = 3 # keep moving at a new velocity
+
+def _decide(state, speed, last_va, mkr_other):
+    """Decide what a joystick event asks of its motor, without any USB I/O
+
+    Args:
+        state (int): Raw axis value of the event
+        speed (int): Maximal speed of the axis
+        last_va (int): Velocity last sent to the motor, -1 after a stop
+        mkr_other (int): Marker of the other axis on the motor
+
+    Returns:
+        (action, velocity): one of the ACT_* constants and the velocity the motor
+            should be at, -1 for a stop
+    """
+    if mkr_other:
+        return ACT_IGNORE, last_va
+    axis = state * INV_32768
+    if abs(axis) < DEADBAND:
+        return ACT_STOP, -1
+    v = int(speed * abs(axis))
+    # the first velocity after a stop is always sent, the motor may still hold
+    # the one of the other axis; the deadband only filters changes while moving
+    if last_va < 0 or abs(v - last_va) >= speed * VA_DEADBAND:
+        return ACT_SPEED, v
+    return ACT_HOLD, last_va
 
 class Controller(object):
     """Picomotor Controller
@@ -80,6 +193,10 @@ class Controller(object):
         """
         self.idProduct = idProduct
         self.idVendor = idVendor
+        self._motion = {m: False for m in range(1, 5)} # whether each motor was last told to move (MV) rather than stop (ST)
+        self._query_lock = threading.Lock() # keeps the write and read of one query together
+        self._io = ThreadPoolExecutor(max_workers=1) # runs command_async in submission order
+        self._held = None # writes collected between hold_writes() and flush_writes(release=True)
         self._connect()
 
     def _connect(self):
@@ -102,10 +219,26 @@ class Controller(object):
         if self.dev is None:
             raise ValueError('Device not found')
 
+        # take the interface from a kernel driver (Linux) so transfers do not go through it;
+        # other backends do not implement the check
+        try:
+            if self.dev.is_kernel_driver_active(0):
+                self.dev.detach_kernel_driver(0)
+        except NotImplementedError:
+            pass
+
         # set the active configuration. With no arguments, the first
         # configuration will be the active one
         self.dev.set_configuration()
 
+        # claim the interface and pin its alternate setting once, up front; devices
+        # with a single alternate setting may answer SET_INTERFACE with an error
+        usb.util.claim_interface(self.dev, 0)
+        try:
+            self.dev.set_interface_altsetting(interface=0, alternate_setting=0)
+        except usb.core.USBError:
+            pass
+
         # get an endpoint instance
         cfg = self.dev.get_active_configuration()
         intf = cfg[(0,0)]
@@ -127,19 +260,36 @@ class Controller(object):
                 usb.util.ENDPOINT_IN)
 
         assert (self.ep_out and self.ep_in) is not None
+
+        # Replies are read into this buffer in place instead of a new array per read,
+        # large enough for several replies to come back in one transfer
+        self._rx_buf = array.array('B', bytes(RX_BUFFER_SIZE))
+
+        # Endpoint addresses and bound device methods used for every transfer; pyusb
+        # still resolves the interface and endpoint per call, this only saves the
+        # attribute lookups on the Endpoint objects
+        self._epo = self.ep_out.bEndpointAddress
+        self._epi = self.ep_in.bEndpointAddress
+        self._write = self.dev.write
+        self._read = self.dev.read
         
-        # Confirm connection to user
-        self.command('MC')
-        resp = self.command('VE?')
-        print("Connected to Motor Controller Model {}. Firmware {} {} {}\n".format(
-                                                    *resp.split(' ')
-                                                    ))
-        for m in range(1,5):
-            resp = self.command("{}QM?".format(m))
-            print("Motor #{motor_number}: {status}".format(
-                                                    motor_number=m,
-                                                    status=MOTOR_TYPE[resp[-1]]
-                                                    ))
+        # Confirm connection to user; the startup commands go out as one
+        # ';'-separated write and the replies are read back in order
+        queries = ['VE?'] + [f"{m}QM?" for m in range(1,5)]
+        self._write(self._epo, b';'.join(self.parse_command(c)[:-1] for c in ['MC'] + queries) + b'\r')
+        replies = []
+        while len(replies) < len(queries): # the replies may arrive in more than one packet
+            try:
+                n = self._read(self._epi, self._rx_buf, STARTUP_READ_TIMEOUT)
+            except usb.core.USBError:
+                break
+            replies += [r for r in self.parse_reply(self._rx_buf[:n]).split('\r\n') if r]
+        if len(replies) != len(queries): # fall back to one round trip per query
+            replies = [self.command(q) for q in queries]
+
+        ve = replies[0].split(' ')
+        motors = '\n'.join(f"Motor #{m}: {MOTOR_TYPE[resp[-1]]}" for m, resp in enumerate(replies[1:], 1))
+        print(f"Connected to Motor Controller Model {ve[0]}. Firmware {ve[1]} {ve[2]} {ve[3]}\n\n{motors}")
 
 
 
@@ -147,7 +297,7 @@ class Controller(object):
         """Send command to USB device endpoint
         
         Args:
-            usb_command (str): Correctly formated command for USB driver
+            usb_command (bytes): Correctly formated command for USB driver
             get_reply (bool): query the IN endpoint after sending command, to 
                 get controller's reply
 
@@ -155,52 +305,134 @@ class Controller(object):
             Character representation of returned hex values if a reply is 
                 requested
         """
-        self.ep_out.write(usb_command)
-        if get_reply:
-            return self.ep_in.read(100)
+        if not get_reply:
+            self._write(self._epo, usb_command)
+            return
+        with self._query_lock:
+            self._write(self._epo, usb_command)
+            n = self._read(self._epi, self._rx_buf)
+            return self._rx_buf[:n]
             
 
-    def parse_command(self, newfocus_command):
-        """Convert a NewFocus style command into a USB command
+    def _raw_write(self, buf):
+        """Write an already formatted USB command, bypassing parse_command
 
         Args:
-            newfocus_command (str): of the form xxAAnn
-                > The general format of a command is a two character mnemonic (AA). 
-                Both upper and lower case are accepted. Depending on the command, 
-                it could also have optional or required preceding (xx) and/or 
-                following (nn) parameters.
-                cite [2 - 6.1.2]
+            buf (bytes): Complete USB command, e.g. from _ST or _VA_TMPL
         """
-        m = NEWFOCUS_COMMAND_REGEX.match(newfocus_command)
+        if self._held is not None:
+            self._held.append(buf)
+        else:
+            self._write(self._epo, buf)
 
-        # Check to see if a regex match was found in the user submitted command
-        if m:
+    def hold_writes(self):
+        """Collect the following _raw_write commands until flush_writes(release=True) instead of sending them"""
+        if self._held is None:
+            self._held = []
 
-            # Extract matched components of the command
-            driver_number, command, parameter = m.groups()
+    def flush_writes(self, release=True):
+        """Send the commands collected since hold_writes() as one ';'-separated transfer
 
+        Args:
+            release (bool): stop collecting; otherwise the following commands are
+                collected again until the next flush
+        """
+        held, self._held = self._held, None
+        if held:
+            self.write_many(*held)
+        if held is not None and not release:
+            self._held = []
 
-            usb_command = command
+    def write_many(self, *bufs):
+        """Write several already formatted USB commands as one ';'-separated transfer
 
-            # Construct USB safe command
-            if driver_number:
-                usb_command = '1>{driver_number} {command}'.format(
-                                                    driver_number=driver_number,
-                                                    command=usb_command
-                                                    )
-            if parameter:
-                usb_command = '{command} {parameter}'.format(
-                                                    command=usb_command,
-                                                    parameter=parameter
-                                                    )
+        Args:
+            bufs (bytes): Complete USB commands, e.g. from _VA_TMPL and _MV
+        """
+        if self._held is not None:
+            self._held.extend(bufs)
+        elif bufs:
+            self._write(self._epo, b';'.join(buf[:-1] for buf in bufs) + b'\r')
 
-            usb_command += '\r'
+    def move(self, motor, dir, velocity=None):
+        """Start an indefinite move of a motor and remember it is moving
 
-            return usb_command
+        Args:
+            motor (int): Motor number
+            dir (str): '+' or '-'
+            velocity (int): if given, set with 'VA' in the same transfer as the move
+        """
+        if velocity is None:
+            self._raw_write(_MV[(motor, dir)])
         else:
+            self.write_many(_VA_TMPL[motor] % velocity, _MV[(motor, dir)])
+        self._motion[motor] = True
+
+    def stop(self, motor):
+        """Stop a motor and remember it is stopped
+
+        Args:
+            motor (int): Motor number
+        """
+        self._raw_write(_ST[motor])
+        self._motion[motor] = False
+
+    def sync_motion(self, motor):
+        """Replace the local motion state of a motor with the controller's 'MD?' reply
+
+        Args:
+            motor (int): Motor number
+        """
+        self.flush_writes(release=False) # the reply has to reflect the commands sent so far
+        self._motion[motor] = int(self.parse_reply(self.send_command(_MD[motor], True))[-1]) != 1
+
+    def _track_motion(self, newfocus_command):
+        """Update the local motion state for a user command sent through command()"""
+        m = _parse(newfocus_command)
+        if m:
+            driver_number, command, _ = m
+            command = command.upper()
+            if command in ('MV', 'ST'):
+                motors = [int(driver_number)] if driver_number else list(self._motion)
+                for motor in motors:
+                    self._motion[motor] = command == 'MV'
+
+    def command_async(self, newfocus_command):
+        """Send a NewFocus formated command from a background thread
+
+        Commands are sent one at a time in the order they were submitted, so the
+        caller can keep writing to the controller and only wait for the replies it needs.
+
+        Args:
+            newfocus_command (str): Legal command that conforms to NewFocus's
+            required format
+
+        Returns:
+            concurrent.futures.Future: resolves to the reply of command()
+        """
+        return self._io.submit(self.command, newfocus_command)
+
+    def parse_command(self, newfocus_command):
+        """Convert a NewFocus style command into a USB command
+
+        Args:
+            newfocus_command (str): of the form xxAAnn
+                > The general format of a command is a two character mnemonic (AA). 
+                Both upper and lower case are accepted. Depending on the command, 
+                it could also have optional or required preceding (xx) and/or 
+                following (nn) parameters.
+                cite [2 - 6.1.2]
+
+        Returns:
+            usb_command (bytes): Command ready to be written to the OUT endpoint,
+                None if the command does not have a valid format
+        """
+        usb_command = _parse_command_cached(newfocus_command)
+        if usb_command is None:
             print("ERROR! Command {} was not a valid format".format(
                                                             newfocus_command
                                                             ))
+        return usb_command
 
 
     def parse_reply(self, reply):
@@ -214,8 +446,7 @@ class Controller(object):
         """
 
         # convert hex to characters 
-        reply = ''.join([chr(x) for x in reply])
-        return reply.rstrip()
+        return bytes(reply).decode('ascii', 'replace').rstrip()
 
 
     def command(self, newfocus_command):
@@ -228,6 +459,9 @@ class Controller(object):
             reply (str): Human readable reply from controller
         """
         usb_command = self.parse_command(newfocus_command)
+        if usb_command is None: # parse_command already reported the error
+            return
+        self._track_motion(newfocus_command)
 
         # if there is a '?' in the command, the user expects a response from
         # the driver
@@ -276,78 +510,109 @@ if __name__ == '__main__':
     # Initialize controller and start console
     controller = Controller(idProduct=idProduct, idVendor=idVendor)
     controller.command('ST')
-    x_mkr = 0 # These makers are used to avoid the disfunction of motor caused by contradicting motions directions
-    y_mkr = 0
-    rx_mkr = 0
-    ry_mkr = 0
+    mkr = {'x': 0, 'y': 0, 'rx': 0, 'ry': 0} # These makers are used to avoid the disfunction of motor caused by contradicting motions directions
+    last_va = {1: -1, 2: -1} # last velocity sent to each motor, -1 after a stop
+    last_md_check = {1: 0.0, 2: 0.0} # time of the last 'MD?' query to each motor, 0 from a stop until it reports done
+    md_pending = {1: None, 2: None} # 'MD?' reply still in flight for each motor
+
+    def watch(motor):
+        """Check the local motion state of a motor with 'MD?' to catch stalls and moves the controller refused
+
+        After a stop the motor may still be decelerating, so until it reports done every
+        event waits for a fresh reply; once moving, the periodic checks run in the
+        background and are applied once answered.
+        """
+        pending = md_pending[motor]
+        if pending is not None and pending.done():
+            controller._motion[motor] = int(pending.result()[-1]) != 1
+            md_pending[motor] = None
+        now = time.monotonic()
+        if last_md_check[motor] == 0.0:
+            controller.sync_motion(motor)
+            if not controller._motion[motor]:
+                last_md_check[motor] = now
+        elif md_pending[motor] is None and now - last_md_check[motor] >= MD_WATCHDOG_INTERVAL:
+            last_md_check[motor] = now
+            md_pending[motor] = controller.command_async('%dMD?' % motor)
+
+    events_q = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+
+    def read_gamepad():
+        """Move joystick events into events_q, so reading the gamepad never waits for USB"""
+        try:
+            while True:
+                for event in get_gamepad():
+                    if event.ev_type == 'Absolute':
+                        events_q.put(event)
+        except BaseException as e: # hand the error (e.g. an unplugged gamepad) to the main loop
+            events_q.put(e)
+
+    def next_events():
+        """Wait for joystick events and return the latest one of each axis seen within COALESCE_WINDOW
+
+        A dead-zone event ends the batch, so the stop it stands for is never merged into
+        a later move (e.g. when the stick is flicked through the centre)
+        """
+        while True: # a wait without timeout cannot be interrupted by Ctrl+C on Windows
+            try:
+                event = events_q.get(timeout=EVENT_WAIT_TIMEOUT)
+                break
+            except queue.Empty:
+                pass
+        if isinstance(event, BaseException):
+            raise event
+        latest = {event.code: event}
+        deadline = time.monotonic() + COALESCE_WINDOW
+        while abs(event.state * INV_32768) >= DEADBAND:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                event = events_q.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if isinstance(event, BaseException):
+                events_q.put(event) # raised by the next call, after this batch is handled
+                break
+            latest[event.code] = event
+        return latest.values()
+
+    def handle(motor, speed, self_key, other_key, state):
+        """Drive a motor from one joystick axis, unless the other axis on that motor is in use"""
+        action, v = _decide(state, speed, last_va[motor], mkr[other_key])
+        if action == ACT_IGNORE:
+            return
+        if action == ACT_STOP:
+            controller.stop(motor)
+            last_va[motor] = v
+            last_md_check[motor] = 0.0
+            md_pending[motor] = None
+            mkr[self_key] = 0
+        else:
+            #if float(controller.command('{}MV?'.format(motor))[-1]) * axis < 0: # Used to prevent fast change of motion direction, but seems uncessary
+            #    controller.command('{}ST'.format(motor))
+            if DEBUG and self_key == 'x':
+                print(controller.command('MD?'))
+            watch(motor)
+            moving = controller._motion[motor]
+            if action == ACT_SPEED:
+                last_va[motor] = v
+                if moving:
+                    controller._raw_write(_VA_TMPL[motor] % v)
+            if not moving:
+                if state > 0:
+                    dir = '+'
+                else:
+                    dir = '-'
+                mkr[self_key] = 1
+                controller.move(motor, dir, v if action == ACT_SPEED else None) # VA and MV in one transfer
+
+    threading.Thread(target=read_gamepad, daemon=True).start()
     while True: #loop to detect the changes of joystick/gamepad
-        events = get_gamepad()
-        for event in events:
+        controller.hold_writes() # the commands for one batch of events go out in a single transfer
+        for event in next_events():
             if event.ev_type == 'Absolute':
-                axis = event.state / 32768 # 32768 is the bound of the axis of the joystick we used, it is used to normalize the value of axis
-                if event.code == 'ABS_X' and not rx_mkr:
-                    #print(axis)
-                    if -0.05 < axis and 0.05 > axis:
-                        controller.command('1ST')
-                        x_mkr = 0 
-                    else:
-                        controller.command('1VA'+str(int(2000 * abs(axis)))) # 2000 is the maximal speed for New Focus motor 8821-L
-                        #if float(controller.command('1MV?')[-1]) * axis < 0: # Used to prevent fast change of motion direction, but seems uncessary
-                        #    controller.command('1ST')
-                        print(controller.command('MD?'))
-                        if int(controller.command('1MD?')[-1]) == 1:
-                            if axis > 0:
-                                dir = '+'
-                            else:
-                                dir = '-'
-                            x_mkr = 1
-                            controller.command('1MV'+dir)
-                elif event.code == 'ABS_Y' and not ry_mkr: # Same as the 'ABS_X' part but for an additional axis
-                    #print(axis)
-                    if -0.05 < axis and 0.05 > axis:
-                        controller.command('2ST')
-                        y_mkr = 0 
-                    else:
-                        controller.command('2VA'+str(int(2000 * abs(axis))))
-                        #if float(controller.command('2MV?')[-1]) * axis < 0:
-                        #    controller.command('2ST')
-                        if int(controller.command('2MD?')[-1]) == 1:
-                            if axis > 0:
-                                dir = '+'
-                            else:
-                                dir = '-'
-                            y_mkr = 1
-                            controller.command('2MV'+dir)
-                elif event.code == 'ABS_RX' and not x_mkr: # Same as the 'ABS_X' part but for an additional axis
-                    #print(axis)
-                    if -0.05 < axis and 0.05 > axis:
-                        controller.command('1ST')
-                        rx_mkr = 0 
-                    else:
-                        controller.command('1VA'+str(int(200 * abs(axis))))
-                        #if float(controller.command('1MV?')[-1]) * axis < 0:
-                        #    controller.command('1ST')
-                        if int(controller.command('1MD?')[-1]) == 1:
-                            if axis > 0:
-                                dir = '+'
-                            else:
-                                dir = '-'
-                            rx_mkr = 1
-                            controller.command('1MV'+dir)
-                elif event.code == 'ABS_RY' and not y_mkr: # Same as the 'ABS_X' part but for an additional axis
-                    #print(axis)
-                    if -0.05 < axis and 0.05 > axis:
-                        controller.command('2ST')
-                        ry_mkr = 0 
-                    else:
-                        controller.command('2VA'+str(int(200 * abs(axis))))
-                        #if float(controller.command('2MV?')[-1]) * axis < 0:
-                        #    controller.command('2ST')
-                        if int(controller.command('2MD?')[-1]) == 1:
-                            if axis > 0:
-                                dir = '+'
-                            else:
-                                dir = '-'
-                            ry_mkr = 1
-                            controller.command('2MV'+dir)
-
+                spec = AXES.get(event.code)
+                if spec:
+                    handle(*spec, event.state)
+        controller.flush_writes()